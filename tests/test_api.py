@@ -63,3 +63,13 @@ async def test_api_command(mock_command, api):
     except zigate_api.NoResponseError:
         pass
     assert mock_command.call_count == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "version_rsp, expected_version",
+    [[((261, 798), 0), "3.1e"], [((5, 801), 0), "3.21"]],
+)
+async def test_version_str(api, version_rsp, expected_version):
+    with patch.object(api, "version", return_value=version_rsp):
+        assert await api.version_str() == expected_version
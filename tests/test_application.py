@@ -1,9 +1,11 @@
+import asyncio
 import logging
 from unittest.mock import AsyncMock, MagicMock, call, patch
 
 import pytest
 import zigpy.config as config
 import zigpy.exceptions
+import zigpy.state
 import zigpy.types as zigpy_t
 
 import zigpy_zigate.api
@@ -14,7 +16,7 @@ APP_CONFIG = {
     config.CONF_DEVICE: {config.CONF_DEVICE_PATH: "/dev/null"},
     config.CONF_DATABASE: None,
 }
-FAKE_FIRMWARE_VERSION = "3.1z"
+FAKE_FIRMWARE_VERSION = "3.1e"
 
 
 @pytest.fixture
@@ -69,7 +71,7 @@ async def test_form_network_success(app):
     assert app.state.node_info.ieee == zigpy.types.EUI64.convert(
         "01:23:45:67:89:ab:cd:ef"
     )
-    assert app.state.node_info.version == "3.1z"
+    assert app.state.node_info.version == "3.1e"
     assert app.state.node_info.model == "ZiGate USB-TTL"
     assert app.state.node_info.manufacturer == "ZiGate"
     assert app.state.network_info.pan_id == 0x1234
@@ -79,6 +81,122 @@ async def test_form_network_success(app):
     assert app._api.reset.call_count == 0
 
 
+@pytest.mark.asyncio
+async def test_write_network_info_extended_pan_id(app):
+    app._api.erase_persistent_data = AsyncMock()
+    app._api.set_channel = AsyncMock()
+    app._api.set_extended_panid = AsyncMock()
+    app._api.start_network = AsyncMock(return_value=[[t.Status.Success], 0])
+    app.load_network_info = AsyncMock()
+
+    network_info = zigpy.state.NetworkInfo(
+        extended_pan_id=zigpy_t.ExtendedPanId.convert("12:34:ab:cd:ef:01:23:45"),
+        channel=15,
+    )
+
+    with patch("asyncio.sleep"):
+        await app.write_network_info(
+            network_info=network_info, node_info=zigpy.state.NodeInfo()
+        )
+
+    app._api.set_extended_panid.assert_called_once_with(0x1234ABCDEF012345)
+
+
+@pytest.mark.asyncio
+async def test_write_network_info_backoff_failed(app):
+    app._api.erase_persistent_data = AsyncMock()
+    app._api.set_channel = AsyncMock()
+    app._api.set_extended_panid = AsyncMock()
+    app._api.start_network = AsyncMock(return_value=[[t.Status.Success], 0])
+    app.load_network_info = AsyncMock(side_effect=zigpy.exceptions.NetworkNotFormed())
+
+    network_info = zigpy.state.NetworkInfo(
+        extended_pan_id=zigpy_t.ExtendedPanId.convert("12:34:ab:cd:ef:01:23:45"),
+        channel=15,
+    )
+
+    with patch("asyncio.sleep") as mock_sleep:
+        with pytest.raises(zigpy.exceptions.FormationFailure):
+            await app.write_network_info(
+                network_info=network_info, node_info=zigpy.state.NodeInfo()
+            )
+
+    delays = [c.args[0] for c in mock_sleep.mock_calls]
+    assert delays == pytest.approx([0.1, 0.3, 0.9, 1.7])
+    assert sum(delays) == pytest.approx(3.0)
+    assert app.load_network_info.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_write_network_info_backoff_success(app):
+    app._api.erase_persistent_data = AsyncMock()
+    app._api.set_channel = AsyncMock()
+    app._api.set_extended_panid = AsyncMock()
+    app._api.start_network = AsyncMock(return_value=[[t.Status.Success], 0])
+    app.load_network_info = AsyncMock(
+        side_effect=[zigpy.exceptions.NetworkNotFormed(), None]
+    )
+
+    network_info = zigpy.state.NetworkInfo(
+        extended_pan_id=zigpy_t.ExtendedPanId.convert("12:34:ab:cd:ef:01:23:45"),
+        channel=15,
+    )
+
+    with patch("asyncio.sleep") as mock_sleep:
+        await app.write_network_info(
+            network_info=network_info, node_info=zigpy.state.NodeInfo()
+        )
+
+    delays = [c.args[0] for c in mock_sleep.mock_calls]
+    assert delays == pytest.approx([0.1, 0.3])
+    assert app.load_network_info.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("zigpy_zigate.common.is_zigate_din", return_value=False)
+async def test_load_network_info_model_cached(is_zigate_din, app):
+    app._api.get_network_state = AsyncMock(
+        return_value=[
+            [0x0000, t.EUI64.deserialize(bytes(8))[0], 0x1234, 0x1234ABCD, 0x11],
+            0,
+        ]
+    )
+    app._api.get_network_key = AsyncMock(
+        side_effect=zigpy_zigate.api.CommandNotSupportedError()
+    )
+
+    await app.load_network_info()
+    await app.load_network_info()
+
+    assert app.state.node_info.model == "ZiGate USB-TTL"
+    assert is_zigate_din.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("zigpy_zigate.common.is_zigate_din", return_value=False)
+async def test_load_network_info_devices(is_zigate_din, app):
+    app._api.get_network_state = AsyncMock(
+        return_value=[
+            [0x0000, t.EUI64.deserialize(bytes(8))[0], 0x1234, 0x1234ABCD, 0x11],
+            0,
+        ]
+    )
+    app._api.get_network_key = AsyncMock(
+        side_effect=zigpy_zigate.api.CommandNotSupportedError()
+    )
+    app._api.get_devices_list = AsyncMock(
+        return_value=t.DeviceEntryArray.deserialize(
+            bytes.fromhex("01abcd0102030405060708000a" "02ef010807060504030201015a")
+        )[0]
+    )
+
+    await app.load_network_info(load_devices=True)
+
+    ieee = zigpy_t.EUI64.convert("01:02:03:04:05:06:07:08")
+    assert app.state.network_info.children == [ieee]
+    assert app.state.network_info.nwk_addresses == {ieee: 0xABCD}
+
+
 @pytest.mark.asyncio
 async def test_form_network_failed(app):
     app._api.erase_persistent_data = AsyncMock()
@@ -153,11 +271,28 @@ async def test_startup_connect(zigate_new, app, version_rsp, expected_version):
     assert app.version == expected_version
 
 
+@pytest.mark.parametrize(
+    "version, legacy, old",
+    [
+        ["", True, True],
+        ["3.1d", True, True],
+        ["3.1e", False, True],
+        ["3.21", False, False],
+        ["3.100", False, False],
+    ],
+)
+def test_version_flags(app, version, legacy, old):
+    app.version = version
+
+    assert app._legacy_firmware is legacy
+    assert app._old_firmware is old
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "version, addr_mode",
     [
-        ["3.1z", t.AddressMode.NWK_NO_ACK],
+        ["3.1e", t.AddressMode.NWK_NO_ACK],
         ["3.1d", t.AddressMode.NWK],
     ],
 )
@@ -193,6 +328,63 @@ async def test_send_unicast_request(app, version, addr_mode):
     app._api.raw_aps_data_request.assert_called_once()
 
 
+def _unicast_packet():
+    return zigpy_t.ZigbeePacket(
+        src=zigpy_t.AddrModeAddress(addr_mode=zigpy_t.AddrMode.NWK, address=0x0000),
+        src_ep=1,
+        dst=zigpy_t.AddrModeAddress(addr_mode=zigpy_t.AddrMode.NWK, address=0xFA5D),
+        dst_ep=1,
+        tsn=20,
+        profile_id=260,
+        cluster_id=6,
+        data=zigpy_t.SerializableBytes(b"\x01\x14\x00"),
+        tx_options=zigpy_t.TransmitOptions.NONE,
+        radius=0,
+    )
+
+
+@pytest.mark.asyncio
+async def test_send_unicast_request_failure(app):
+    app._api.raw_aps_data_request.return_value = (
+        [t.Status.NoAck, 163, 1328, b"\x00\x00"],
+        0,
+    )
+
+    with pytest.raises(zigpy.exceptions.DeliveryError):
+        await app.send_packet(_unicast_packet())
+
+    assert app._pending[163] is None
+
+
+@pytest.mark.asyncio
+async def test_send_unicast_request_invalid_parameter_legacy(app):
+    app.version = "3.1d"
+    app._api.raw_aps_data_request.return_value = (
+        [t.Status.InvalidParameter, 163, 1328, b"\x00\x00"],
+        0,
+    )
+
+    await app.send_packet(_unicast_packet())
+
+    assert app._pending[163] is None
+
+
+@pytest.mark.asyncio
+async def test_send_unicast_request_stale_future(app):
+    stale_fut = asyncio.get_running_loop().create_future()
+    app._pending[163] = stale_fut
+    app._api.raw_aps_data_request.return_value = (
+        [t.Status.Success, 163, 1328, b"\x00\x00"],
+        0,
+    )
+
+    await app.send_packet(_unicast_packet())
+
+    assert stale_fut.cancelled()
+    assert app._pending[163] is not stale_fut
+    assert not app._pending[163].done()
+
+
 @pytest.mark.asyncio
 async def test_send_group_request(app):
     packet = zigpy_t.ZigbeePacket(
@@ -243,3 +435,190 @@ async def test_channel_migration(app, caplog):
     await app._move_network_to_channel(17, new_nwk_update_id=2)
 
     assert app._api.set_channel.mock_calls == [call(17)]
+
+
+def test_callback_data_indication(app):
+    app.packet_received = MagicMock()
+
+    app.zigate_callback_handler(
+        zigpy_zigate.api.ResponseId.DATA_INDICATION,
+        [
+            t.Status.Success,
+            260,
+            6,
+            1,
+            1,
+            t.Address(address_mode=t.AddressMode.NWK, address=t.NWK(0x1234)),
+            t.Address(address_mode=t.AddressMode.NWK, address=t.NWK(0x0000)),
+            b"\x01\x02\x03",
+        ],
+        123,
+    )
+
+    assert app.packet_received.call_count == 1
+    packet = app.packet_received.mock_calls[0].args[0]
+    assert packet.src == zigpy_t.AddrModeAddress(
+        addr_mode=zigpy_t.AddrMode.NWK, address=0x1234
+    )
+    assert packet.dst == zigpy_t.AddrModeAddress(
+        addr_mode=zigpy_t.AddrMode.NWK, address=0x0000
+    )
+    assert packet.profile_id == 260
+    assert packet.cluster_id == 6
+    assert packet.data.serialize() == b"\x01\x02\x03"
+    assert packet.lqi == 123
+
+
+def test_callback_device_announce(app):
+    app.handle_join = MagicMock()
+    ieee = t.EUI64.deserialize(b"\x01\x02\x03\x04\x05\x06\x07\x08")[0]
+
+    app.zigate_callback_handler(
+        zigpy_zigate.api.ResponseId.DEVICE_ANNOUNCE, [0x1234, ieee, 0x8E, 0], 0
+    )
+
+    app.handle_join.assert_called_once_with(0x1234, zigpy_t.EUI64(ieee), 0)
+
+
+@patch("zigpy.application.ControllerApplication.handle_join")
+def test_callback_device_announce_duplicate(handle_join, app):
+    ieee = t.EUI64.deserialize(b"\x01\x02\x03\x04\x05\x06\x07\x08")[0]
+    announce = [0x1234, ieee, 0x8E, 0]
+
+    with patch("time.monotonic", return_value=100.0):
+        app.zigate_callback_handler(
+            zigpy_zigate.api.ResponseId.DEVICE_ANNOUNCE, announce, 0
+        )
+        app.zigate_callback_handler(
+            zigpy_zigate.api.ResponseId.DEVICE_ANNOUNCE, announce, 0
+        )
+
+    assert handle_join.call_count == 1
+
+    with patch("time.monotonic", return_value=101.0):
+        app.zigate_callback_handler(
+            zigpy_zigate.api.ResponseId.DEVICE_ANNOUNCE, announce, 0
+        )
+
+    assert handle_join.call_count == 2
+
+
+@patch("zigpy.application.ControllerApplication.handle_join")
+def test_callback_device_announce_and_zdo_announce(handle_join, app):
+    app.get_device_with_address = MagicMock()
+    ieee = t.EUI64.deserialize(b"\x01\x02\x03\x04\x05\x06\x07\x08")[0]
+
+    # ZDO Device_annce: TSN, NWK, IEEE and capability
+    zdo_announce = zigpy_t.ZigbeePacket(
+        src=zigpy_t.AddrModeAddress(addr_mode=zigpy_t.AddrMode.NWK, address=0x1234),
+        src_ep=0,
+        dst=zigpy_t.AddrModeAddress(
+            addr_mode=zigpy_t.AddrMode.Broadcast, address=0xFFFD
+        ),
+        dst_ep=0,
+        profile_id=0x0000,
+        cluster_id=0x0013,
+        data=zigpy_t.SerializableBytes(
+            b"\x01\x34\x12" + zigpy_t.EUI64(ieee).serialize() + b"\x8e"
+        ),
+    )
+
+    with patch("time.monotonic", return_value=100.0):
+        app.zigate_callback_handler(
+            zigpy_zigate.api.ResponseId.DEVICE_ANNOUNCE, [0x1234, ieee, 0x8E, 0], 0
+        )
+        app.packet_received(zdo_announce)
+
+    handle_join.assert_called_once()
+
+
+def test_callback_leave_indication(app):
+    app.handle_leave = MagicMock()
+    ieee = t.EUI64.deserialize(b"\x01\x02\x03\x04\x05\x06\x07\x08")[0]
+
+    app.zigate_callback_handler(
+        zigpy_zigate.api.ResponseId.LEAVE_INDICATION, [ieee, 0], 0
+    )
+
+    app.handle_leave.assert_called_once_with(0, zigpy_t.EUI64(ieee))
+
+
+def test_callback_unhandled(app):
+    app.packet_received = MagicMock()
+    app.zigate_callback_handler(zigpy_zigate.api.ResponseId.HEART_BEAT, [0], 0)
+    assert app.packet_received.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_handle_frame_failure(app):
+    fut = asyncio.get_running_loop().create_future()
+    app._pending[0x12] = fut
+
+    app.zigate_callback_handler(
+        zigpy_zigate.api.ResponseId.APS_DATA_CONFIRM_FAILED,
+        [t.Status.NoAck, 1, 1, None, 0x12],
+        0,
+    )
+
+    assert fut.result() == t.Status.NoAck
+    assert app._pending[0x12] is None
+
+
+@pytest.mark.asyncio
+async def test_handle_frame_failure_no_ack(app, caplog):
+    packet = zigpy_t.ZigbeePacket(
+        src=zigpy_t.AddrModeAddress(addr_mode=zigpy_t.AddrMode.NWK, address=0x0000),
+        src_ep=1,
+        dst=zigpy_t.AddrModeAddress(addr_mode=zigpy_t.AddrMode.NWK, address=0xFA5D),
+        dst_ep=1,
+        tsn=20,
+        profile_id=260,
+        cluster_id=6,
+        data=zigpy_t.SerializableBytes(b"\x01\x14\x00"),
+        tx_options=zigpy_t.TransmitOptions.NONE,
+        radius=0,
+    )
+
+    app._api.raw_aps_data_request.return_value = (
+        [t.Status.Success, 0x12, 1328, b"\x00\x00"],
+        0,
+    )
+    await app.send_packet(packet)
+
+    assert (
+        app._api.raw_aps_data_request.mock_calls[0].kwargs["addr_mode"]
+        == t.AddressMode.NWK_NO_ACK
+    )
+
+    with caplog.at_level(logging.WARNING):
+        app.zigate_callback_handler(
+            zigpy_zigate.api.ResponseId.APS_DATA_CONFIRM_FAILED,
+            [t.Status.NoAck, 1, 1, None, 0x12],
+            0,
+        )
+
+    assert "Unexpected message send failure" not in caplog.text
+    assert app._pending[0x12] is None
+
+
+def test_handle_frame_failure_unexpected(app, caplog):
+    with caplog.at_level(logging.WARNING):
+        app._handle_frame_failure(0x12, t.Status.NoAck)
+
+    assert "Unexpected message send failure" in caplog.text
+
+
+def test_handle_frame_failure_truncated(app, caplog):
+    schema = zigpy_zigate.api.RESPONSES[
+        zigpy_zigate.api.ResponseId.APS_DATA_CONFIRM_FAILED
+    ]
+    # The trailing message tag is missing
+    response, _ = t.deserialize(bytes.fromhex("d4010102abcd"), schema)
+    assert response[4] is None
+
+    with caplog.at_level(logging.WARNING):
+        app.zigate_callback_handler(
+            zigpy_zigate.api.ResponseId.APS_DATA_CONFIRM_FAILED, response, 0
+        )
+
+    assert "Unexpected message send failure" in caplog.text
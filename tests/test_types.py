@@ -1,5 +1,7 @@
 import binascii
 
+import pytest
+
 from zigpy_zigate import types as t
 from zigpy_zigate.api import COMMANDS, RESPONSES
 
@@ -104,6 +106,12 @@ def test_serialize():
     assert result == b"\x02\x124"
 
 
+def test_LBytes():
+    data, rest = t.LBytes.deserialize(b"\x02\x12\x34\x56")
+    assert data == b"\x12\x34"
+    assert rest == b"\x56"
+
+
 def test_EUI64():
     data = b"\x12\x34\x56\x78\x9a\xbc\xde\xf0\x00"
     ieee, rest = t.EUI64.deserialize(data)
@@ -113,6 +121,9 @@ def test_EUI64():
     assert data2 == b"\x12\x34\x56\x78\x9a\xbc\xde\xf0"
     assert str(ieee) == "12:34:56:78:9a:bc:de:f0"
 
+    with pytest.raises(ValueError):
+        t.EUI64.deserialize(data[:7])
+
 
 def test_NWK():
     data = b"\x124"
@@ -121,3 +132,37 @@ def test_NWK():
     data2 = nwk.serialize()
     assert data2 == data
     assert repr(nwk) == "0x1234"
+
+
+def test_DeviceEntryArray():
+    data = binascii.unhexlify(b"011234123456789abcdef000ff02abcd0011223344556677010a")
+    entries, rest = t.DeviceEntryArray.deserialize(data)
+    assert rest == b""
+    assert len(entries) == 2
+
+    assert entries[0].id == 0x01
+    assert entries[0].short_addr == t.NWK(0x1234)
+    assert entries[0].ieee_addr == t.EUI64.deserialize(data[3:11])[0]
+    assert entries[0].power_source == 0x00
+    assert entries[0].link_quality == 0xFF
+
+    assert entries[1].short_addr == t.NWK(0xABCD)
+    assert str(entries[1].ieee_addr) == "00:11:22:33:44:55:66:77"
+    assert entries.serialize() == data
+
+
+def test_struct_deserialize():
+    data = binascii.unhexlify(b"011234123456789abcdef000ff")
+    entry, rest = t.DeviceEntry.deserialize(data + b"\xaa")
+    assert rest == b"\xaa"
+    assert entry.id == 0x01
+    assert entry.short_addr == t.NWK(0x1234)
+    assert str(entry.ieee_addr) == "12:34:56:78:9a:bc:de:f0"
+    assert entry.power_source == 0x00
+    assert entry.link_quality == 0xFF
+    assert entry.serialize() == data
+
+
+def test_addr_mode_table():
+    for (zigpy_addr, ack), zigate_addr in t.ZIGPY_TO_ZIGATE_ADDR_MODE.items():
+        assert t.ZIGPY_TO_ZIGATE_ADDR_MODE_TABLE[(zigpy_addr << 1) | ack] is zigate_addr
@@ -59,6 +59,15 @@ def test_data_received_chunk_frame(gw):
     assert gw._api.data_received.call_args[0] == (0x8010, b"\x00\x0f?\xf0", 255)
 
 
+def test_data_received_byte_by_byte(gw):
+    data = b"\x01\x80\x10\x02\x10\x02\x15\xaa\x02\x10\x02\x1f?\xf0\xff\x03" * 2
+    for i in range(len(data)):
+        gw.data_received(data[i : i + 1])
+    assert gw._api.data_received.call_count == 2
+    assert gw._api.data_received.call_args[0] == (0x8010, b"\x00\x0f?\xf0", 255)
+    assert gw._buffer == b""
+
+
 def test_data_received_full_frame(gw):
     data = b"\x01\x80\x10\x02\x10\x02\x15\xaa\x02\x10\x02\x1f?\xf0\xff\x03"
     gw.data_received(data)
@@ -86,6 +95,13 @@ def test_data_received_extra(gw):
     assert gw._buffer == b"\x00"
 
 
+def test_data_received_truncated_frame(gw):
+    data = b"\x01\x80\x10\x02\x10\x02\x15\x03"
+    gw.data_received(data)
+    assert gw._api.data_received.call_count == 0
+    assert gw._buffer == b""
+
+
 def test_data_received_wrong_checksum(gw):
     data = b"\x01\x80\x10\x02\x10\x02\x15\xab\x02\x10\x02\x1f?\xf0\xff\x03"
     gw.data_received(data)
@@ -106,6 +122,19 @@ def test_escape(gw):
     assert r == data_escaped
 
 
+def test_escape_roundtrip(gw):
+    data = bytes(range(256))
+    escaped = gw._escape(data)
+    assert all(b >= 0x10 or b == 0x02 for b in escaped)
+    assert gw._unescape(escaped) == data
+
+
+@pytest.mark.parametrize("padding", (0, 64))
+def test_unescape_dangling_escape(gw, padding):
+    data = b"\xaa" * padding
+    assert gw._unescape(data + b"\x02\x12\xaa\x02") == data + b"\x02\xaa"
+
+
 def test_length(gw):
     data = b"\x80\x10\x00\x05\xaa\x00\x0f?\xf0\xff"
     length = 5
@@ -120,6 +149,15 @@ def test_checksum(gw):
     assert r == checksum
 
 
+@pytest.mark.parametrize("size", (0, 1, 2, 3, 64, 100, 101, 255))
+def test_checksum_large(gw, size):
+    data = bytes((i * 37) & 0xFF for i in range(size))
+    checksum = 0x12 ^ 0x34
+    for b in data:
+        checksum ^= b
+    assert gw._checksum(b"\x12\x34", data) == checksum
+
+
 @pytest.mark.parametrize(
     "port",
     ("/dev/ttyAMA0", "/dev/serial0", "pizigate:/dev/ttyAMA0"),
@@ -164,6 +202,47 @@ def test_is_not_zigatedin(port, monkeypatch):
     assert r is False
 
 
+def _mock_port(device, description, hwid):
+    port = MagicMock()
+    port.device = device
+    port.description = description
+    port.hwid = hwid
+    return port
+
+
+def test_discover_port(monkeypatch):
+    comports = MagicMock(
+        return_value=[
+            _mock_port("/dev/ttyUSB0", "Other", "USB VID:PID=1234:5678"),
+            _mock_port("/dev/ttyUSB1", "ZiGate", "USB VID:PID=0403:6001"),
+        ]
+    )
+    monkeypatch.setattr(serial.tools.list_ports, "comports", comports)
+
+    assert common.discover_port() == "/dev/ttyUSB1"
+    assert comports.call_count == 1
+
+
+def test_discover_port_fallback(monkeypatch):
+    comports = MagicMock(
+        return_value=[
+            _mock_port("/dev/ttyUSB0", "Other", "USB VID:PID=1234:5678"),
+            _mock_port("/dev/ttyUSB1", "CP2102 USB to UART", "USB VID:PID=10c4:ea60"),
+        ]
+    )
+    monkeypatch.setattr(serial.tools.list_ports, "comports", comports)
+
+    assert common.discover_port() == "/dev/ttyUSB1"
+    assert comports.call_count == 1
+
+
+def test_discover_port_not_found(monkeypatch):
+    monkeypatch.setattr(serial.tools.list_ports, "comports", MagicMock(return_value=[]))
+
+    with pytest.raises(serial.SerialException):
+        common.discover_port()
+
+
 def test_is_zigate_wifi():
     port = "socket://192.168.1.10:9999"
     r = common.is_zigate_wifi(port)
@@ -1,5 +1,4 @@
 import asyncio
-import binascii
 from datetime import datetime, timezone
 import enum
 import functools
@@ -256,9 +255,7 @@ class ZiGate:
 
     def data_received(self, cmd, data, lqi):
         if cmd not in RESPONSES:
-            LOGGER.warning(
-                "Received unhandled response 0x%04x: %r", cmd, binascii.hexlify(data)
-            )
+            LOGGER.warning("Received unhandled response 0x%04x: %s", cmd, data.hex())
             return
         cmd = ResponseId(cmd)
         data, rest = t.deserialize(data, RESPONSES[cmd])
@@ -386,9 +383,8 @@ class ZiGate:
 
     async def version_str(self):
         version, lqi = await self.version()
-        version = "{:x}".format(version[1])
-        version = "{}.{}".format(version[0], version[1:])
-        return version
+        major, minor = divmod(version[1], 0x100)
+        return f"{major:x}.{minor:x}"
 
     async def get_network_state(self):
         return await self.command(
@@ -13,6 +13,9 @@ LOGGER = logging.getLogger(__name__)
 GPIO_PIN0 = 17
 GPIO_PIN2 = 27
 
+PIZIGATE_PORT_RE = re.compile(r"/dev/(tty(S|AMA)|serial)\d+")
+TTYUSB_PORT_RE = re.compile(r"/dev/ttyUSB\d+")
+
 
 class UnclosableOutputDevice(OutputDevice):
     """
@@ -33,14 +36,28 @@ class UnclosableOutputDevice(OutputDevice):
         self.pin_factory.close = lambda *args, **kwargs: None
 
 
+def grep_ports(ports, regexp):
+    """filter enumerated ports the same way `serial.tools.list_ports.grep` does"""
+    pattern = re.compile(regexp, re.I)
+    return [
+        port
+        for port in ports
+        if pattern.search(port.device)
+        or pattern.search(port.description)
+        or pattern.search(port.hwid)
+    ]
+
+
 def discover_port():
     """discover zigate port"""
-    devices = list(serial.tools.list_ports.grep("ZiGate"))
+    # Enumerating ports is slow on some hosts, only do it once
+    ports = serial.tools.list_ports.comports()
+    devices = grep_ports(ports, "ZiGate")
     if devices:
         port = devices[0].device
         LOGGER.info("ZiGate found at %s", port)
     else:
-        devices = list(serial.tools.list_ports.grep("067b:2303|CP2102"))
+        devices = grep_ports(ports, "067b:2303|CP2102")
         if devices:
             port = devices[0].device
             LOGGER.info("ZiGate probably found at %s", port)
@@ -56,13 +73,13 @@ def is_pizigate(port):
     if port.startswith("pizigate:"):
         return True
     port = os.path.realpath(port)
-    return re.match(r"/dev/(tty(S|AMA)|serial)\d+", port) is not None
+    return PIZIGATE_PORT_RE.match(port) is not None
 
 
 def is_zigate_din(port):
     """detect zigate din"""
     port = os.path.realpath(port)
-    if re.match(r"/dev/ttyUSB\d+", port):
+    if TTYUSB_PORT_RE.match(port):
         try:
             device = next(serial.tools.list_ports.grep(port))
             # Suppose zigate din /dev/ttyUSBx
@@ -35,7 +35,7 @@ ZIGATE_FLASH_END = 0x00040000
 class Command:
     def __init__(self, type_, fmt=None, raw=False):
         assert not (raw and fmt), "Raw commands cannot use built-in struct formatting"
-        LOGGER.debug("Command {} {} {}".format(type_, fmt, raw))
+        LOGGER.debug("Command %s %s %s", type_, fmt, raw)
         self.type = type_
         self.raw = raw
         if fmt:
@@ -65,7 +65,7 @@ class Command:
 
 class Response:
     def __init__(self, type_, data, chksum):
-        LOGGER.debug("Response {} {} {}".format(type_, data, chksum))
+        LOGGER.debug("Response %s %s %s", type_, data, chksum)
         self.type = type_
         self.data = data[1:]
         self.chksum = chksum
@@ -110,16 +110,16 @@ def prepare(type_, data):
 def read_response(ser):
     length = ser.read()
     length = int.from_bytes(length, "big")
-    LOGGER.debug("read_response length {}".format(length))
+    LOGGER.debug("read_response length %s", length)
     answer = ser.read(length)
-    LOGGER.debug("read_response answer {}".format(answer))
+    LOGGER.debug("read_response answer %s", answer)
     return _unpack_raw_message(length, answer)
     # type_, data, chksum = struct.unpack('!B%dsB' % (length - 2), answer)
     # return {'type': type_, 'data': data, 'chksum': chksum}
 
 
 def _unpack_raw_message(length, decoded):
-    LOGGER.debug("unpack raw message {} {}".format(length, decoded))
+    LOGGER.debug("unpack raw message %s %s", length, decoded)
     if len(decoded) != length or length < 2:
         LOGGER.exception("Unpack failed, length: %d, msg %s" % (length, decoded.hex()))
         return
@@ -1,4 +1,5 @@
 import enum
+import struct
 
 import zigpy.types
 
@@ -6,11 +7,11 @@ import zigpy.types
 def deserialize(data, schema):
     result = []
     for type_ in schema:
-        # value, data = type_.deserialize(data)
-        if data:
-            value, data = type_.deserialize(data)
-        else:
-            value = None
+        if not data:
+            # Fields missing from a truncated response are reported as `None`
+            result.extend([None] * (len(schema) - len(result)))
+            break
+        value, data = type_.deserialize(data)
         result.append(value)
     return result, data
 
@@ -34,7 +35,7 @@ class LBytes(bytes):
 
     @classmethod
     def deserialize(cls, data, byteorder="big"):
-        _bytes = int.from_bytes(data[:1], byteorder)
+        _bytes = data[0]
         s = data[1 : _bytes + 1]
         return s, data[_bytes + 1 :]
 
@@ -42,24 +43,32 @@ class LBytes(bytes):
 class int_t(int):
     _signed = True
     _size = 0
+    # Precompiled big-endian layout for the sizes `struct` natively supports
+    _struct = None
 
     def serialize(self, byteorder="big"):
+        if self._struct is not None and byteorder == "big":
+            return self._struct.pack(self)
         return self.to_bytes(self._size, byteorder, signed=self._signed)
 
     @classmethod
     def deserialize(cls, data, byteorder="big"):
+        size = cls._size
+        if cls._struct is not None and byteorder == "big" and len(data) >= size:
+            return cls(cls._struct.unpack_from(data)[0]), data[size:]
         # Work around https://bugs.python.org/issue23640
-        r = cls(int.from_bytes(data[: cls._size], byteorder, signed=cls._signed))
-        data = data[cls._size :]
-        return r, data
+        r = cls(int.from_bytes(data[:size], byteorder, signed=cls._signed))
+        return r, data[size:]
 
 
 class int8s(int_t):
     _size = 1
+    _struct = struct.Struct(">b")
 
 
 class int16s(int_t):
     _size = 2
+    _struct = struct.Struct(">h")
 
 
 class int24s(int_t):
@@ -68,6 +77,7 @@ class int24s(int_t):
 
 class int32s(int_t):
     _size = 4
+    _struct = struct.Struct(">i")
 
 
 class int40s(int_t):
@@ -84,6 +94,7 @@ class int56s(int_t):
 
 class int64s(int_t):
     _size = 8
+    _struct = struct.Struct(">q")
 
 
 class uint_t(int_t):
@@ -92,10 +103,12 @@ class uint_t(int_t):
 
 class uint8_t(uint_t):
     _size = 1
+    _struct = struct.Struct(">B")
 
 
 class uint16_t(uint_t):
     _size = 2
+    _struct = struct.Struct(">H")
 
 
 class uint24_t(uint_t):
@@ -104,6 +117,7 @@ class uint24_t(uint_t):
 
 class uint32_t(uint_t):
     _size = 4
+    _struct = struct.Struct(">I")
 
 
 class uint40_t(uint_t):
@@ -120,17 +134,21 @@ class uint56_t(uint_t):
 
 class uint64_t(uint_t):
     _size = 8
+    _struct = struct.Struct(">Q")
 
 
 class EUI64(zigpy.types.EUI64):
+    # ZiGate sends IEEE addresses big endian, reverse the bytes in one slice
     @classmethod
     def deserialize(cls, data):
-        r, data = super().deserialize(data)
-        return cls(r[::-1]), data
+        length = cls._length
+        if len(data) < length:
+            raise ValueError(f"Data is too short to contain {cls.__name__}: {data!r}")
+        return cls(data[length - 1 :: -1]), data[length:]
 
     def serialize(self):
         assert self._length == len(self)
-        return super().serialize()[::-1]
+        return bytes(self[::-1])
 
 
 class NWK(uint16_t):
@@ -277,6 +295,8 @@ class LogLevel(uint8_t, enum.Enum):
 
 
 class Struct:
+    # Subclasses list their field names in `__slots__` to avoid a per-instance dict
+    __slots__ = ()
     _fields = []
 
     def __init__(self, *args, **kwargs):
@@ -293,11 +313,13 @@ class Struct:
                 setattr(self, k, v)
 
     def serialize(self):
-        r = b""
-        for field in self._fields:
-            if hasattr(self, field[0]):
-                r += getattr(self, field[0]).serialize()
-        return r
+        return b"".join(
+            [
+                getattr(self, name).serialize()
+                for name, _ in self._fields
+                if hasattr(self, name)
+            ]
+        )
 
     @classmethod
     def deserialize(cls, data):
@@ -329,6 +351,12 @@ ZIGPY_TO_ZIGATE_ADDR_MODE = {
     (zigpy.types.AddrMode.Group, False): AddressMode.GROUP,
 }
 
+# flat form of the mapping above, indexed by `(zigpy_addr_mode << 1) | ack`
+ZIGPY_TO_ZIGATE_ADDR_MODE_TABLE = [None] * 32
+for (_zigpy_addr, _ack), _zigate_addr in ZIGPY_TO_ZIGATE_ADDR_MODE.items():
+    ZIGPY_TO_ZIGATE_ADDR_MODE_TABLE[(_zigpy_addr << 1) | _ack] = _zigate_addr
+del _zigpy_addr, _ack, _zigate_addr
+
 ZIGATE_TO_ZIGPY_ADDR_MODE = {
     zigate_addr: (zigpy_addr, ack)
     for (zigpy_addr, ack), zigate_addr in ZIGPY_TO_ZIGATE_ADDR_MODE.items()
@@ -336,6 +364,7 @@ ZIGATE_TO_ZIGPY_ADDR_MODE = {
 
 
 class Address(Struct):
+    __slots__ = ("address_mode", "address")
     _fields = [
         ("address_mode", AddressMode),
         ("address", EUI64),
@@ -368,6 +397,7 @@ class Address(Struct):
 
 
 class DeviceEntry(Struct):
+    __slots__ = ("id", "short_addr", "ieee_addr", "power_source", "link_quality")
     _fields = [
         ("id", uint8_t),
         ("short_addr", NWK),
@@ -378,18 +408,20 @@ class DeviceEntry(Struct):
 
 
 class DeviceEntryArray(tuple):
+    # id, short_addr, ieee_addr (big endian), power_source, link_quality
+    _entry = struct.Struct(">BH8sBB")
+
     @classmethod
     def deserialize(cls, data):
-        if len(data) % 13 != 0:
+        if len(data) % cls._entry.size != 0:
             raise ValueError("Data is not an array of DeviceEntry")
 
-        entries = []
-
-        while data:
-            entry, data = DeviceEntry.deserialize(data)
-            entries.append(entry)
+        entries = [
+            DeviceEntry(id_, nwk, ieee[::-1], power_source, lqi)
+            for id_, nwk, ieee, power_source, lqi in cls._entry.iter_unpack(data)
+        ]
 
-        return cls(entries), data
+        return cls(entries), b""
 
     def serialize(self):
         return b"".join([e.serialize() for e in self])
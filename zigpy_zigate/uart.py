@@ -1,5 +1,4 @@
 import asyncio
-import binascii
 import logging
 import struct
 from typing import Any, Dict
@@ -11,13 +10,54 @@ from . import common as c
 
 LOGGER = logging.getLogger(__name__)
 
+# Bytes below 0x10 are escaped as 0x02 followed by the byte XOR 0x10. Escaping 0x02
+# first keeps the escape bytes inserted for the other values from being escaped again.
+_ESCAPE_SEQUENCES = [(b"\x02", b"\x02\x12")] + [
+    (bytes([b]), bytes([0x02, b ^ 0x10])) for b in range(0x10) if b != 0x02
+]
+_XOR10 = bytes(b ^ 0x10 for b in range(256))
+
+# Command, payload length and checksum
+_FRAME_HEADER = struct.Struct("!HHB")
+
+# Below this size, a per-byte loop unescapes faster than splitting on escape bytes
+_UNESCAPE_SPLIT_THRESHOLD = 48
+
+# Above this size, folding the data as one big integer beats a per-byte loop
+_XOR_FOLD_THRESHOLD = 100
+
+
+def _xor_fold(data):
+    """XOR all bytes together by repeatedly folding the halves of a big integer."""
+    size = len(data)
+    value = int.from_bytes(data, "big")
+
+    while size > 1:
+        half = size // 2
+        value = (value >> (8 * half)) ^ (value & ((1 << (8 * half)) - 1))
+        size -= half
+
+    return value
+
+
+class _Hex:
+    """Hex-encodes data only when a log record is actually formatted."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return self.data.hex()
+
 
 class Gateway(asyncio.Protocol):
     START = b"\x01"
     END = b"\x03"
 
     def __init__(self, api, connected_future=None):
-        self._buffer = b""
+        self._buffer = bytearray()
         self._connected_future = connected_future
         self._api = api
 
@@ -48,82 +88,111 @@ class Gateway(asyncio.Protocol):
 
     def send(self, cmd, data=b""):
         """Send data, taking care of escaping and framing"""
-        LOGGER.debug("Send: 0x%04x %s", cmd, binascii.hexlify(data))
+        LOGGER.debug("Send: 0x%04x %s", cmd, _Hex(data))
         length = len(data)
-        byte_head = struct.pack("!HH", cmd, length)
-        checksum = self._checksum(byte_head, data)
-        frame = struct.pack("!HHB%ds" % length, cmd, length, checksum, data)
-        LOGGER.debug("Frame to send: %s", frame)
+        checksum = self._checksum(
+            cmd >> 8, cmd & 0xFF, length >> 8, length & 0xFF, data
+        )
+        frame = bytearray(_FRAME_HEADER.size + length)
+        _FRAME_HEADER.pack_into(frame, 0, cmd, length, checksum)
+        frame[_FRAME_HEADER.size :] = data
+        LOGGER.debug("Frame to send: %s", _Hex(frame))
         frame = self._escape(frame)
-        LOGGER.debug("Frame escaped: %s", frame)
-        self._transport.write(self.START + frame + self.END)
+        LOGGER.debug("Frame escaped: %s", _Hex(frame))
+        self._transport.write(b"".join((self.START, frame, self.END)))
 
     def data_received(self, data):
         """Callback when there is data received from the uart"""
-        self._buffer += data
+        if self._buffer:
+            self._buffer.extend(data)
+            buf = self._buffer
+            # Previously buffered bytes never contain an end marker, only scan new data
+            endpos = buf.find(self.END, len(buf) - len(data))
+        else:
+            # Nothing is pending, so parse frames straight from the received data
+            buf = data
+            endpos = buf.find(self.END)
         #         LOGGER.debug('data_received %s', self._buffer)
-        endpos = self._buffer.find(self.END)
+        offset = 0
         while endpos != -1:
-            startpos = self._buffer.rfind(self.START, 0, endpos)
-            if startpos != -1 and startpos < endpos:
-                frame = self._buffer[startpos : endpos + 1]
-                frame = self._unescape(frame[1:-1])
-                cmd, length, checksum, f_data, lqi = struct.unpack(
-                    "!HHB%dsB" % (len(frame) - 6), frame
-                )
-                if self._length(frame) != length:
-                    LOGGER.warning(
-                        "Invalid length: %s, data: %s", length, len(frame) - 6
-                    )
-                    self._buffer = self._buffer[endpos + 1 :]
-                    endpos = self._buffer.find(self.END)
-                    continue
-                if self._checksum(frame[:4], lqi, f_data) != checksum:
-                    LOGGER.warning(
-                        "Invalid checksum: %s, data: 0x%s",
-                        checksum,
-                        binascii.hexlify(frame).decode(),
-                    )
-                    self._buffer = self._buffer[endpos + 1 :]
-                    endpos = self._buffer.find(self.END)
-                    continue
-                LOGGER.debug("Frame received: %s", binascii.hexlify(frame).decode())
-                self._api.data_received(cmd, f_data, lqi)
+            startpos = buf.rfind(self.START, offset, endpos)
+            if startpos != -1:
+                self._frame_received(self._unescape(buf[startpos + 1 : endpos]))
             else:
                 LOGGER.warning("Malformed packet received, ignore it")
-            self._buffer = self._buffer[endpos + 1 :]
-            endpos = self._buffer.find(self.END)
+            offset = endpos + 1
+            endpos = buf.find(self.END, offset)
+
+        if buf is self._buffer:
+            del self._buffer[:offset]
+        elif offset < len(buf):
+            self._buffer.extend(buf[offset:])
+
+    def _frame_received(self, frame):
+        if len(frame) < _FRAME_HEADER.size + 1:
+            LOGGER.warning("Truncated frame received, ignore it")
+            return
+        cmd, length, checksum = _FRAME_HEADER.unpack_from(frame)
+        f_data = frame[_FRAME_HEADER.size : -1]
+        lqi = frame[-1]
+        if self._length(frame) != length:
+            LOGGER.warning("Invalid length: %s, data: %s", length, len(frame) - 6)
+            return
+        if self._checksum(frame[:4], lqi, f_data) != checksum:
+            LOGGER.warning(
+                "Invalid checksum: %s, data: 0x%s",
+                checksum,
+                _Hex(frame),
+            )
+            return
+        LOGGER.debug("Frame received: %s", _Hex(frame))
+        self._api.data_received(cmd, f_data, lqi)
 
     def _unescape(self, data):
-        flip = False
-        ret = []
-        for b in data:
-            if flip:
-                flip = False
-                ret.append(b ^ 0x10)
-            elif b == 0x02:
-                flip = True
-            else:
-                ret.append(b)
-        return bytes(ret)
+        if len(data) < _UNESCAPE_SPLIT_THRESHOLD:
+            flip = False
+            ret = bytearray()
+            for b in data:
+                if flip:
+                    flip = False
+                    ret.append(b ^ 0x10)
+                elif b == 0x02:
+                    flip = True
+                else:
+                    ret.append(b)
+            return bytes(ret)
+
+        parts = data.split(b"\x02")
+        ret = [parts[0]]
+        it = iter(parts[1:])
+        for part in it:
+            if part:
+                ret.append(part[:1].translate(_XOR10))
+                ret.append(part[1:])
+                continue
+            # An empty part means the escaped byte is itself 0x02, which makes the
+            # following part literal. A dangling escape byte at the end is dropped.
+            part = next(it, None)
+            if part is not None:
+                ret.append(b"\x12")
+                ret.append(part)
+        return b"".join(ret)
 
     def _escape(self, data):
-        ret = []
-        for b in data:
-            if b < 0x10:
-                ret.extend([0x02, 0x10 ^ b])
-            else:
-                ret.append(b)
-        return bytes(ret)
+        for byte, escaped in _ESCAPE_SEQUENCES:
+            data = data.replace(byte, escaped)
+        return data
 
     def _checksum(self, *args):
         chcksum = 0
         for arg in args:
             if isinstance(arg, int):
                 chcksum ^= arg
-                continue
-            for x in arg:
-                chcksum ^= x
+            elif len(arg) > _XOR_FOLD_THRESHOLD:
+                chcksum ^= _xor_fold(arg)
+            else:
+                for x in arg:
+                    chcksum ^= x
         return chcksum
 
     def _length(self, frame):
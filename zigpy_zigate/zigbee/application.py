@@ -3,6 +3,7 @@ from __future__ import annotations
 import asyncio
 import importlib.metadata
 import logging
+import time
 from typing import Any
 
 import zigpy.application
@@ -25,16 +26,67 @@ from zigpy_zigate.api import (
 LIB_VERSION = importlib.metadata.version("zigpy-zigate")
 LOGGER = logging.getLogger(__name__)
 
+# Identical device announces received within this window are treated as duplicates
+DEVICE_ANNOUNCE_DEDUP_WINDOW = 0.5
+DEVICE_ANNOUNCE_DEDUP_MAX_ENTRIES = 256
+
+# Polling for a formed network backs off exponentially within a fixed total budget
+NETWORK_FORMATION_TIMEOUT = 3.0
+NETWORK_FORMATION_INITIAL_DELAY = 0.1
+NETWORK_FORMATION_BACKOFF = 3
+
+# Firmware versions as (major, minor), compared numerically rather than as strings
+LEGACY_FIRMWARE_VERSION = (3, 0x1D)
+MIN_FIRMWARE_VERSION = (3, 0x21)
+
+TX_OPTIONS_ACK = zigpy.types.TransmitOptions.ACK
+PDM_EVENT_NAMES = {event.value: event.name for event in PDM_EVENT}
+
+
+def _parse_version(version: str) -> tuple[int, int]:
+    """Parse a "major.minor" hex firmware version, unknown versions sort first."""
+    try:
+        major, minor = version.split(".")
+        return int(major, 16), int(minor, 16)
+    except ValueError:
+        return (0, 0)
+
 
 class ControllerApplication(zigpy.application.ControllerApplication):
     def __init__(self, config: dict[str, Any]):
         super().__init__(config)
         self._api: ZiGate | None = None
 
-        self._pending = {}
-        self._pending_join = []
-
-        self.version: str = ""
+        # Send futures indexed by the 8-bit message tag the ZiGate assigns
+        self._pending: list[asyncio.Future | None] = [None] * 256
+        self._pending_join = set()
+        self._recent_announces: dict[tuple[int, bytes], float] = {}
+
+        self.version = ""
+        self._model: str | None = None
+
+        self._callback_handlers = {
+            ResponseId.LEAVE_INDICATION: self._handle_leave_indication,
+            ResponseId.DEVICE_ANNOUNCE: self._handle_device_announce,
+            ResponseId.DATA_INDICATION: self._handle_data_indication,
+            ResponseId.ACK_DATA: self._handle_ack_data,
+            ResponseId.APS_DATA_CONFIRM: self._handle_aps_data_confirm,
+            ResponseId.PDM_EVENT: self._handle_pdm_event,
+            ResponseId.APS_DATA_CONFIRM_FAILED: self._handle_aps_data_confirm_failed,
+            ResponseId.EXTENDED_ERROR: self._handle_extended_error,
+        }
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    @version.setter
+    def version(self, version: str) -> None:
+        self._version = version
+
+        parsed = _parse_version(version)
+        self._legacy_firmware = parsed <= LEGACY_FIRMWARE_VERSION
+        self._old_firmware = parsed < MIN_FIRMWARE_VERSION
 
     async def _watchdog_feed(self):
         await self._api.set_time()
@@ -50,7 +102,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
 
         self._api = api
 
-        if self.version < "3.21":
+        if self._old_firmware:
             LOGGER.error(
                 "Old ZiGate firmware detected, you should upgrade to 3.21 or newer"
             )
@@ -79,29 +131,19 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         if not network_state or network_state[3] == 0 or network_state[0] == 0xFFFF:
             raise zigpy.exceptions.NetworkNotFormed()
 
-        port = self._config[zigpy.config.CONF_DEVICE][zigpy.config.CONF_DEVICE_PATH]
-
-        if c.is_zigate_wifi(port):
-            model = "ZiGate WiFi"
-        elif c.is_pizigate(port):
-            model = "PiZiGate"
-        elif c.is_zigate_din(port):
-            model = "ZiGate USB-DIN"
-        else:
-            model = "ZiGate USB-TTL"
+        if self._model is None:
+            self._model = self._detect_model()
 
         self.state.node_info = zigpy.state.NodeInfo(
             nwk=zigpy.types.NWK(network_state[0]),
             ieee=zigpy.types.EUI64(network_state[1]),
             logical_type=zigpy.zdo.types.LogicalType.Coordinator,
-            model=model,
+            model=self._model,
             manufacturer="ZiGate",
             version=self.version,
         )
 
-        epid, _ = zigpy.types.ExtendedPanId.deserialize(
-            zigpy.types.uint64_t(network_state[3]).serialize()
-        )
+        epid = zigpy.types.ExtendedPanId(int(network_state[3]).to_bytes(8, "little"))
 
         try:
             network_key_data = await self._api.get_network_key()
@@ -136,15 +178,27 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         if not load_devices:
             return
 
-        for device in await self._api.get_devices_list():
-            if device.power_source != 0:  # only battery-powered devices
-                continue
+        children = [
+            (zigpy.types.EUI64(device.ieee_addr), zigpy.types.NWK(device.short_addr))
+            for device in await self._api.get_devices_list()
+            if device.power_source == 0  # only battery-powered devices
+        ]
 
-            ieee = zigpy.types.EUI64(device.ieee_addr)
-            self.state.network_info.children.append(ieee)
-            self.state.network_info.nwk_addresses[ieee] = zigpy.types.NWK(
-                device.short_addr
-            )
+        self.state.network_info.children.extend(ieee for ieee, _ in children)
+        self.state.network_info.nwk_addresses.update(children)
+
+    def _detect_model(self) -> str:
+        """Detect the ZiGate model from the configured port, it cannot change."""
+        port = self._config[zigpy.config.CONF_DEVICE][zigpy.config.CONF_DEVICE_PATH]
+
+        if c.is_zigate_wifi(port):
+            return "ZiGate WiFi"
+        elif c.is_pizigate(port):
+            return "PiZiGate"
+        elif c.is_zigate_din(port):
+            return "ZiGate USB-DIN"
+        else:
+            return "ZiGate USB-TTL"
 
     async def reset_network_info(self):
         await self._api.erase_persistent_data()
@@ -155,9 +209,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         await self.reset_network_info()
         await self._api.set_channel(network_info.channel)
 
-        epid, _ = zigpy.types.uint64_t.deserialize(
-            network_info.extended_pan_id.serialize()
-        )
+        epid = int.from_bytes(bytes(network_info.extended_pan_id), "little")
         await self._api.set_extended_panid(epid)
 
         network_formed, lqi = await self._api.start_network()
@@ -172,15 +224,24 @@ class ControllerApplication(zigpy.application.ControllerApplication):
             )
 
         LOGGER.warning("Starting network got status %s, wait...", network_formed[0])
-        for attempt in range(3):
-            await asyncio.sleep(1)
+        delay = NETWORK_FORMATION_INITIAL_DELAY
+        remaining = NETWORK_FORMATION_TIMEOUT
+
+        while True:
+            delay = min(delay, remaining)
+            remaining -= delay
+            await asyncio.sleep(delay)
 
             try:
                 await self.load_network_info()
             except zigpy.exceptions.NetworkNotFormed as e:
-                if attempt == 2:
+                if remaining <= 0:
                     raise zigpy.exceptions.FormationFailure() from e
 
+                delay *= NETWORK_FORMATION_BACKOFF
+            else:
+                break
+
     async def permit_with_link_key(self, node, link_key, time_s=60):
         LOGGER.warning("ZiGate does not support joins with link keys")
 
@@ -208,78 +269,124 @@ class ControllerApplication(zigpy.application.ControllerApplication):
     def zigate_callback_handler(self, msg, response, lqi):
         LOGGER.debug("zigate_callback_handler %s %s", msg, response)
 
-        if msg == ResponseId.LEAVE_INDICATION:
-            nwk = 0
-            ieee = zigpy.types.EUI64(response[0])
-            self.handle_leave(nwk, ieee)
-        elif msg == ResponseId.DEVICE_ANNOUNCE:
-            nwk = response[0]
-            ieee = zigpy.types.EUI64(response[1])
-            parent_nwk = 0
-            self.handle_join(nwk, ieee, parent_nwk)
-            # Temporary disable two stages pairing due to firmware bug
-            # rejoin = response[3]
-            # if nwk in self._pending_join or rejoin:
-            #     LOGGER.debug('Finish pairing {} (2nd device announce)'.format(nwk))
-            #     if nwk in self._pending_join:
-            #         self._pending_join.remove(nwk)
-            #     self.handle_join(nwk, ieee, parent_nwk)
-            # else:
-            #     LOGGER.debug('Start pairing {} (1st device announce)'.format(nwk))
-            #     self._pending_join.append(nwk)
-        elif msg == ResponseId.DATA_INDICATION:
-            (
-                status,
-                profile_id,
-                cluster_id,
-                src_ep,
-                dst_ep,
-                src,
-                dst,
-                payload,
-            ) = response
-
-            packet = zigpy.types.ZigbeePacket(
-                src=src.to_zigpy_type()[0],
-                src_ep=src_ep,
-                dst=dst.to_zigpy_type()[0],
-                dst_ep=dst_ep,
-                profile_id=profile_id,
-                cluster_id=cluster_id,
-                data=zigpy.types.SerializableBytes(payload),
-                lqi=lqi,
-                rssi=None,
-            )
+        handler = self._callback_handlers.get(msg)
+        if handler is not None:
+            handler(response, lqi)
 
-            self.packet_received(packet)
-        elif msg == ResponseId.ACK_DATA:
-            LOGGER.debug("ACK Data received %s %s", response[4], response[0])
-            # disabled because of https://github.com/fairecasoimeme/ZiGate/issues/324
-            # self._handle_frame_failure(response[4], response[0])
-        elif msg == ResponseId.APS_DATA_CONFIRM:
-            LOGGER.debug(
-                "ZPS Event APS data confirm, message routed to %s %s",
-                response[3],
-                response[0],
-            )
-        elif msg == ResponseId.PDM_EVENT:
-            try:
-                event = PDM_EVENT(response[0]).name
-            except ValueError:
-                event = "Unknown event"
-            LOGGER.debug("PDM Event %s %s, record %s", response[0], event, response[1])
-        elif msg == ResponseId.APS_DATA_CONFIRM_FAILED:
-            LOGGER.debug("APS Data confirm Fail %s %s", response[4], response[0])
-            self._handle_frame_failure(response[4], response[0])
-        elif msg == ResponseId.EXTENDED_ERROR:
-            LOGGER.warning("Extended error code %s", response[0])
+    def _handle_leave_indication(self, response, lqi):
+        nwk = 0
+        ieee = zigpy.types.EUI64(response[0])
+        self.handle_leave(nwk, ieee)
+
+    def handle_join(self, nwk, ieee, parent_nwk, *, handle_rejoin=True):
+        # A join is reported both by the 0x004D announce and by the ZDO Device_annce
+        # that zigpy parses from the data indication, only handle it once
+        if handle_rejoin and self._is_duplicate_announce(nwk, ieee):
+            LOGGER.debug("Ignoring duplicate device announce from %s (%s)", ieee, nwk)
+            return
+
+        super().handle_join(nwk, ieee, parent_nwk, handle_rejoin=handle_rejoin)
+
+    def _is_duplicate_announce(self, nwk, ieee):
+        key = (nwk, bytes(ieee))
+        now = time.monotonic()
+        last_seen = self._recent_announces.get(key)
+
+        if last_seen is not None and now - last_seen < DEVICE_ANNOUNCE_DEDUP_WINDOW:
+            return True
+
+        if len(self._recent_announces) >= DEVICE_ANNOUNCE_DEDUP_MAX_ENTRIES:
+            self._recent_announces = {
+                k: ts
+                for k, ts in self._recent_announces.items()
+                if now - ts < DEVICE_ANNOUNCE_DEDUP_WINDOW
+            }
+
+        self._recent_announces[key] = now
+        return False
+
+    def _handle_device_announce(self, response, lqi):
+        nwk = response[0]
+        ieee = zigpy.types.EUI64(response[1])
+
+        parent_nwk = 0
+        self.handle_join(nwk, ieee, parent_nwk)
+        # Temporary disable two stages pairing due to firmware bug
+        # rejoin = response[3]
+        # if nwk in self._pending_join or rejoin:
+        #     LOGGER.debug('Finish pairing %s (2nd device announce)', nwk)
+        #     if nwk in self._pending_join:
+        #         self._pending_join.remove(nwk)
+        #     self.handle_join(nwk, ieee, parent_nwk)
+        # else:
+        #     LOGGER.debug('Start pairing %s (1st device announce)', nwk)
+        #     self._pending_join.add(nwk)
+
+    def _handle_data_indication(self, response, lqi):
+        (
+            status,
+            profile_id,
+            cluster_id,
+            src_ep,
+            dst_ep,
+            src,
+            dst,
+            payload,
+        ) = response
+
+        packet = zigpy.types.ZigbeePacket(
+            src=src.to_zigpy_type()[0],
+            src_ep=src_ep,
+            dst=dst.to_zigpy_type()[0],
+            dst_ep=dst_ep,
+            profile_id=profile_id,
+            cluster_id=cluster_id,
+            data=zigpy.types.SerializableBytes(payload),
+            lqi=lqi,
+            rssi=None,
+        )
+
+        self.packet_received(packet)
+
+    def _handle_ack_data(self, response, lqi):
+        LOGGER.debug("ACK Data received %s %s", response[4], response[0])
+        # disabled because of https://github.com/fairecasoimeme/ZiGate/issues/324
+        # self._handle_frame_failure(response[4], response[0])
+
+    def _handle_aps_data_confirm(self, response, lqi):
+        LOGGER.debug(
+            "ZPS Event APS data confirm, message routed to %s %s",
+            response[3],
+            response[0],
+        )
+
+    def _handle_pdm_event(self, response, lqi):
+        event = PDM_EVENT_NAMES.get(response[0], "Unknown event")
+        LOGGER.debug("PDM Event %s %s, record %s", response[0], event, response[1])
+
+    def _handle_aps_data_confirm_failed(self, response, lqi):
+        LOGGER.debug("APS Data confirm Fail %s %s", response[4], response[0])
+        self._handle_frame_failure(response[4], response[0])
+
+    def _handle_extended_error(self, response, lqi):
+        LOGGER.warning("Extended error code %s", response[0])
 
     def _handle_frame_failure(self, message_tag, status):
+        # Truncated responses report missing fields as `None`
+        if message_tag is None or not 0 <= message_tag < len(self._pending):
+            LOGGER.warning("Unexpected message send failure")
+            return
+
+        send_fut = self._pending[message_tag]
+
+        if send_fut is None:
+            LOGGER.warning("Unexpected message send failure")
+            return
+
+        self._pending[message_tag] = None
+
         try:
-            send_fut = self._pending.pop(message_tag)
             send_fut.set_result(status)
-        except KeyError:
-            LOGGER.warning("Unexpected message send failure")
         except asyncio.futures.InvalidStateError as exc:
             LOGGER.debug(
                 "Invalid state on future - probably duplicate response: %s", exc
@@ -290,10 +397,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
 
         # Firmwares 3.1d and below allow a couple of _NO_ACK packets to send but all
         # subsequent ones will fail. ACKs must be enabled.
-        ack = (
-            zigpy.types.TransmitOptions.ACK in packet.tx_options
-            or self.version <= "3.1d"
-        )
+        ack = bool(packet.tx_options & TX_OPTIONS_ACK) or self._legacy_firmware
 
         try:
             (status, tsn, packet_type, _), _ = await self._api.raw_aps_data_request(
@@ -305,33 +409,30 @@ class ControllerApplication(zigpy.application.ControllerApplication):
                 profile=packet.profile_id,
                 cluster=packet.cluster_id,
                 payload=packet.data.serialize(),
-                addr_mode=t.ZIGPY_TO_ZIGATE_ADDR_MODE[packet.dst.addr_mode, ack],
+                addr_mode=t.ZIGPY_TO_ZIGATE_ADDR_MODE_TABLE[
+                    (packet.dst.addr_mode << 1) | ack
+                ],
                 radius=packet.radius,
             )
         except NoResponseError:
             raise zigpy.exceptions.DeliveryError("ZiGate did not respond to command")
 
-        self._pending[tsn] = asyncio.get_running_loop().create_future()
+        # A message tag is reused after 256 sends, drop a stale future in its slot
+        stale_fut = self._pending[tsn]
+        if stale_fut is not None:
+            stale_fut.cancel()
+            self._pending[tsn] = None
 
         if status != t.Status.Success:
-            self._pending.pop(tsn)
-
             # Firmwares 3.1d and below fail to send packets on every request
-            if status == t.Status.InvalidParameter and self.version <= "3.1d":
-                pass
-            else:
-                raise zigpy.exceptions.DeliveryError(
-                    f"Failed to send packet: {status!r}", status=status
-                )
+            if status == t.Status.InvalidParameter and self._legacy_firmware:
+                return
 
-        # disabled because of https://github.com/fairecasoimeme/ZiGate/issues/324
-        # try:
-        #     v = await asyncio.wait_for(send_fut, 120)
-        # except asyncio.TimeoutError:
-        #     return 1, "timeout waiting for message %s send ACK" % (sequence, )
-        # finally:
-        #     self._pending.pop(tsn)
-        # return v, "Message sent"
+            raise zigpy.exceptions.DeliveryError(
+                f"Failed to send packet: {status!r}", status=status
+            )
+
+        self._pending[tsn] = asyncio.get_running_loop().create_future()
 
     async def permit_ncp(self, time_s=60):
         assert 0 <= time_s <= 254